@@ -8,7 +8,7 @@ import traceback
 import jsonschema
 import yaml
 from flasgger import Swagger
-from flask import Flask, g, Response, request
+from flask import Flask, Response, request
 from flask_cors import CORS
 from flask_restful import Api, Resource
 
@@ -45,10 +45,14 @@ app.config['SWAGGER'] = {
 
 swagger = Swagger(app, template=template)
 
+_search = None
+
 def dug ():
-    if not hasattr(g, 'dug'):
-        g.search = Search(Config.from_env())
-    return g.search
+    # Share one Search (and its connection pool and query cache) across requests
+    global _search
+    if _search is None:
+        _search = Search(Config.from_env())
+    return _search
 
 class DugResource(Resource):
     """ Base class handler for Dug API requests. """
@@ -122,10 +126,10 @@ class DugSearchResource(DugResource):
                             type: string
 
         """
-        logger.debug(f"search:{json.dumps(request.json)}")
+        logger.debug("search:%s", request.json)
         response = {}
         try:
-            app.logger.info (f"search: {json.dumps(request.json, indent=2)}")
+            app.logger.info("search: %s", request.json)
             self.validate(request, component="Search")
             boosted = request.json.pop('boosted', False)
 
@@ -181,10 +185,10 @@ class DugSearchKGResource(DugResource):
                             type: string
 
         """
-        logger.debug(f"search_kg:{json.dumps(request.json)}")
+        logger.debug("search_kg:%s", request.json)
         response = {}
         try:
-            app.logger.info(f"search_kg: {json.dumps(request.json, indent=2)}")
+            app.logger.info("search_kg: %s", request.json)
             self.validate(request, component="Search")
             response = self.create_response(
                 result=dug().search_kg(**request.json),
@@ -231,10 +235,10 @@ class DugSearchVarResource(DugResource):
                             type: string
 
         """
-        logger.debug(f"search_kg:{json.dumps(request.json)}")
+        logger.debug("search_kg:%s", request.json)
         response = {}
         try:
-            app.logger.info(f"search_var: {json.dumps(request.json, indent=2)}")
+            app.logger.info("search_var: %s", request.json)
             self.validate(request, component="Search")
             response = self.create_response(
                 result=dug().search_variables(**request.json),
@@ -252,10 +256,10 @@ class DugAggDataType(DugResource):
     """ System initiation. """
 
     def post(self):
-        logger.debug(f"data_type:{json.dumps(request.json)}")
+        logger.debug("data_type:%s", request.json)
         response = {}
         try:
-            app.logger.info(f"data_type: {json.dumps(request.json, indent=2)}")
+            app.logger.info("data_type: %s", request.json)
             self.validate(request, component="Search")
             response = self.create_response(
                 result=dug().agg_data_type(**request.json),
@@ -4,11 +4,15 @@ Represents the entrypoint for command line tools.
 """
 
 import argparse
+import logging
 import os
 import json
 
 from dug.config import Config
-from dug.core import Dug, logger, DugFactory
+
+# dug.core pulls in elasticsearch, redis and the parsers, so it's only imported by the
+# commands that need it; this keeps `dug --help` and argument errors fast
+logger = logging.getLogger('dug')
 
 
 class KwargParser(argparse.Action):
@@ -94,6 +98,7 @@ def get_argparser():
 
 
 def crawl(args):
+    from dug.core import Dug, DugFactory
     config = Config.from_env()
     factory = DugFactory(config)
     dug = Dug(factory)
@@ -101,6 +106,7 @@ def crawl(args):
 
 
 def search(args):
+    from dug.core import Dug, DugFactory
     config = Config.from_env()
     factory = DugFactory(config)
     dug = Dug(factory)
@@ -110,6 +116,7 @@ def search(args):
     print(jsonResponse)
 
 def datatypes(args):
+    from dug.core import Dug, DugFactory
     config = Config.from_env()
     factory = DugFactory(config)
     dug = Dug(factory)
@@ -1,3 +1,4 @@
+import copy
 import os
 
 from dataclasses import dataclass, field
@@ -5,6 +6,48 @@ from dataclasses import dataclass, field
 
 TRANQL_SOURCE: str = "redis:test"
 
+# Defaults for the mutable Config fields. These are built once at import time and each
+# Config gets its own deep copy, so nothing is shared between Config instances.
+DEFAULT_PREPROCESSOR = {
+    "debreviator": {
+        "BMI": "body mass index"
+    },
+    "stopwords": ["the"]
+}
+
+DEFAULT_ANNOTATOR = {
+    "url": "https://api.monarchinitiative.org/api/nlp/annotate/entities?min_length=4&longest_only=false&include_abbreviation=false&include_acronym=false&include_numbers=false&content="
+}
+
+DEFAULT_NORMALIZER = {
+    "url": "https://nodenormalization-sri.renci.org/1.1/get_normalized_nodes?curie="
+}
+
+DEFAULT_SYNONYM_SERVICE = {
+    "url": "https://onto.renci.org/synonyms/"
+}
+
+DEFAULT_ONTOLOGY_HELPER = {
+    "url": "https://api.monarchinitiative.org/api/bioentity/"
+}
+
+DEFAULT_TRANQL_EXCLUDE_IDENTIFIERS = ["CHEBI:17336"]
+
+DEFAULT_TRANQL_QUERIES = {
+    "disease": ["disease", "phenotypic_feature"],
+    "pheno": ["phenotypic_feature", "disease"],
+    "anat": ["disease", "anatomical_entity"],
+    "chem_to_disease": ["chemical_substance", "disease"],
+    "phen_to_anat": ["phenotypic_feature", "anatomical_entity"],
+}
+
+DEFAULT_CONCEPT_EXPANDER = {
+    "url": "https://tranql-dev.renci.org/tranql/query?dynamic_id_resolution=true&asynchronous=false",
+    "min_tranql_score": 0.0
+}
+
+DEFAULT_ONTOLOGY_GREENLIST = ["PATO", "CHEBI", "MONDO", "UBERON", "HP", "MESH", "UMLS"]
+
 
 @dataclass
 class Config:
@@ -24,52 +67,37 @@ class Config:
     nboost_host: str = "nboost"
     nboost_port: int = 8000
 
+    # Number of concurrent bulk indexing requests and documents sent per request
+    bulk_thread_count: int = 4
+    bulk_chunk_size: int = 500
+
+    # Seconds that data type aggregation and knowledge graph search responses are reused for
+    query_cache_ttl: int = 60
+
     # Preprocessor config that will be passed to annotate.Preprocessor constructor
-    preprocessor: dict = field(default_factory=lambda: {
-        "debreviator": {
-            "BMI": "body mass index"
-        },
-        "stopwords": ["the"]
-    })
+    preprocessor: dict = field(default_factory=lambda: copy.deepcopy(DEFAULT_PREPROCESSOR))
 
     # Annotator config that will be passed to annotate.Annotator constructor
-    annotator: dict = field(default_factory=lambda: {
-        "url": "https://api.monarchinitiative.org/api/nlp/annotate/entities?min_length=4&longest_only=false&include_abbreviation=false&include_acronym=false&include_numbers=false&content="
-    })
+    annotator: dict = field(default_factory=lambda: copy.deepcopy(DEFAULT_ANNOTATOR))
 
     # Normalizer config that will be passed to annotate.Normalizer constructor
-    normalizer: dict = field(default_factory=lambda: {
-        "url": "https://nodenormalization-sri.renci.org/1.1/get_normalized_nodes?curie="
-    })
+    normalizer: dict = field(default_factory=lambda: copy.deepcopy(DEFAULT_NORMALIZER))
 
     # Synonym service config that will be passed to annotate.SynonymHelper constructor
-    synonym_service: dict = field(default_factory=lambda: {
-        "url": "https://onto.renci.org/synonyms/"
-    })
+    synonym_service: dict = field(default_factory=lambda: copy.deepcopy(DEFAULT_SYNONYM_SERVICE))
 
     # Ontology metadata helper config that will be passed to annotate.OntologyHelper constructor
-    ontology_helper: dict = field(default_factory=lambda: {
-        "url": "https://api.monarchinitiative.org/api/bioentity/"
-    })
+    ontology_helper: dict = field(default_factory=lambda: copy.deepcopy(DEFAULT_ONTOLOGY_HELPER))
 
     # Redlist of identifiers not to expand via TranQL
-    tranql_exclude_identifiers: list = field(default_factory=lambda: ["CHEBI:17336"])
+    tranql_exclude_identifiers: list = field(default_factory=lambda: copy.deepcopy(DEFAULT_TRANQL_EXCLUDE_IDENTIFIERS))
 
-    tranql_queries: dict = field(default_factory=lambda: {
-        "disease": ["disease", "phenotypic_feature"],
-        "pheno": ["phenotypic_feature", "disease"],
-        "anat": ["disease", "anatomical_entity"],
-        "chem_to_disease": ["chemical_substance", "disease"],
-        "phen_to_anat": ["phenotypic_feature", "anatomical_entity"],
-    })
+    tranql_queries: dict = field(default_factory=lambda: copy.deepcopy(DEFAULT_TRANQL_QUERIES))
 
-    concept_expander: dict = field(default_factory=lambda: {
-        "url": "https://tranql-dev.renci.org/tranql/query?dynamic_id_resolution=true&asynchronous=false",
-        "min_tranql_score": 0.0
-    })
+    concept_expander: dict = field(default_factory=lambda: copy.deepcopy(DEFAULT_CONCEPT_EXPANDER))
 
     # List of ontology types that can be used even if they fail normalization
-    ontology_greenlist: list = field(default_factory=lambda: ["PATO", "CHEBI", "MONDO", "UBERON", "HP", "MESH", "UMLS"])
+    ontology_greenlist: list = field(default_factory=lambda: copy.deepcopy(DEFAULT_ONTOLOGY_GREENLIST))
 
     @classmethod
     def from_env(cls):
@@ -82,7 +110,10 @@ class Config:
             "redis_port": "REDIS_PORT",
             "redis_password": "REDIS_PASSWORD",
             "nboost_host": "NBOOST_API_HOST",
-            "nboost_port": "NBOOST_API_PORT"
+            "nboost_port": "NBOOST_API_PORT",
+            "bulk_thread_count": "ELASTIC_BULK_THREAD_COUNT",
+            "bulk_chunk_size": "ELASTIC_BULK_CHUNK_SIZE",
+            "query_cache_ttl": "QUERY_CACHE_TTL"
         }
 
         kwargs = {}
@@ -57,8 +57,9 @@ class Dug:
         parser = get_parser(pm.hook, parser_type)
         targets = get_targets(target_name)
 
-        for target in targets:
-            self._crawl(target, parser, element_type)
+        with self._search.bulk_load_mode([self.concepts_index, self.variables_index, self.kg_index]):
+            for target in targets:
+                self._crawl(target, parser, element_type)
 
     def _crawl(self, target: Path, parser: Parser, element_type):
 
@@ -68,10 +69,10 @@ class Dug:
         crawler.crawl()
 
         # Index Annotated Elements
-        for element in crawler.elements:
-            # Only index DugElements as concepts will be indexed differently in next step
-            if not isinstance(element, DugConcept):
-                self._search.index_element(element, index=self.variables_index)
+        # Only index DugElements as concepts will be indexed differently in next step
+        elements = [element for element in crawler.elements if not isinstance(element, DugConcept)]
+        self._search.index_elements(elements, index=self.variables_index)
+        self._search.flush_index_buffer()
 
         # Index Annotated/TranQLized Concepts and associated knowledge graphs
         for concept_id, concept in crawler.concepts.items():
@@ -83,6 +84,7 @@ class Dug:
                                              kg_answer=kg_answer,
                                              index=self.kg_index,
                                              id_suffix=kg_answer_id)
+        self._search.flush_index_buffer()
 
     def search(self, target, query, **kwargs):
         targets = {
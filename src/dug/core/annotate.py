@@ -1,11 +1,14 @@
 import json
 import logging
 import os
+import random
+import time
 import urllib.parse
 from typing import TypeVar, Generic, Union, List, Tuple
 
 import requests
 from requests import Session
+from requests.adapters import HTTPAdapter
 
 import dug.core.tranql as tql
 
@@ -14,6 +17,9 @@ logger = logging.getLogger('dug')
 logging.getLogger("requests").setLevel(logging.WARNING)
 logging.getLogger("urllib3").setLevel(logging.WARNING)
 
+# HTTP status codes worth retrying; anything else is returned to the caller as-is
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
 
 class Identifier:
     def __init__(self, id, label, types=None, search_text="", description=""):
@@ -71,24 +77,47 @@ class DugAnnotator:
         self.norm_fails_file = "norm_fails.txt"
         self.anno_fails_file = "anno_fails.txt"
 
+        # Synonyms and ontology metadata only depend on the curie, and the same curies
+        # turn up across many elements of a crawl, so each one is only looked up once
+        self._synonyms = {}
+        self._ontology_info = {}
+        # Text the annotator has already found nothing in, so it isn't sent again
+        self._unannotated = set()
+
+    def get_synonyms(self, curie, http_session):
+        if curie not in self._synonyms:
+            self._synonyms[curie] = self.synonym_finder.get_synonyms(curie, http_session)
+        return list(self._synonyms[curie])
+
+    def get_ontology_info(self, curie, http_session):
+        if curie not in self._ontology_info:
+            self._ontology_info[curie] = self.ontology_helper.get_ontology_info(curie, http_session)
+        return self._ontology_info[curie]
+
     def annotate(self, text, http_session):
 
         # Preprocess text (debraviate, remove stopwords, etc.)
         text = self.preprocessor.preprocess(text)
 
+        # Nothing to annotate; skip the annotation and normalization round-trips entirely
+        if not text.strip() or text in self._unannotated:
+            return []
+
         # Fetch identifiers
         raw_identifiers = self.annotator.annotate(text, http_session)
 
         # Write out to file if text fails to annotate
         if not raw_identifiers:
+            self._unannotated.add(text)
             with open(self.anno_fails_file, "a") as fh:
                 fh.write(f'{text}\n')
+            return []
 
-        processed_identifiers = []
-        for identifier in raw_identifiers:
+        # Normalize identifiers using normalization service (batched, one request per chunk of curies)
+        norm_ids = self.normalizer.normalize_batch(raw_identifiers, http_session)
 
-            # Normalize identifier using normalization service
-            norm_id = self.normalizer.normalize(identifier, http_session)
+        processed_identifiers = []
+        for identifier, norm_id in zip(raw_identifiers, norm_ids):
 
             # Skip adding id if it doesn't normalize
             if norm_id is None:
@@ -104,10 +133,10 @@ class DugAnnotator:
                 norm_id = identifier
 
             # Add synonyms to identifier
-            norm_id.synonyms = self.synonym_finder.get_synonyms(norm_id.id, http_session)
+            norm_id.synonyms = self.get_synonyms(norm_id.id, http_session)
 
             # Get canonical label, name, and description from ontology metadata service
-            name, desc, ontology_type = self.ontology_helper.get_ontology_info(norm_id.id, http_session)
+            name, desc, ontology_type = self.get_ontology_info(norm_id.id, http_session)
             norm_id.label = name
             norm_id.description = desc
             norm_id.type = ontology_type
@@ -120,17 +149,56 @@ class DugAnnotator:
 
 
 class ConceptExpander:
-    def __init__(self, url, min_tranql_score=0.2):
+    def __init__(self, url, min_tranql_score=0.2, max_retries=3, retry_base_delay=1.0, max_retry_delay=30.0):
         self.url = url
         self.min_tranql_score = min_tranql_score
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.max_retry_delay = max_retry_delay
         self.include_node_keys = ["id", "name", "synonyms"]
         self.include_edge_keys = []
         self.tranql_headers = {"accept": "application/json", "Content-Type": "text/plain"}
 
+        # Reuse keep-alive connections to TranQL across queries (and the crawler's worker threads)
+        self.http_session = requests.Session()
+        self.http_session.mount("http://", HTTPAdapter(pool_maxsize=16))
+        self.http_session.mount("https://", HTTPAdapter(pool_maxsize=16))
+
+        # Parsed answers keyed on kg filename (i.e. identifier + query), since an identifier
+        # shared by several concepts is expanded once per concept
+        self._answers = {}
+
     def is_acceptable_answer(self, answer):
         return True
 
+    def post_query(self, query):
+        # Retry connection errors, timeouts and retryable status codes with capped exponential
+        # backoff (plus jitter) so a single transient failure doesn't abort the whole crawl
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.http_session.post(
+                    url=self.url,
+                    headers=self.tranql_headers,
+                    data=query)
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt == self.max_retries:
+                    return response
+                logger.warning(f"TranQL returned status {response.status_code} (attempt {attempt + 1}). Retrying.")
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"TranQL request failed (attempt {attempt + 1}): {e}. Retrying.")
+
+            delay = min(self.max_retry_delay, self.retry_base_delay * 2 ** attempt)
+            time.sleep(delay * (1 + random.uniform(0, 0.5)))
+
     def expand_identifier(self, identifier, query_factory, kg_filename):
+        # Reuse answers already parsed for this identifier/query instead of re-reading
+        # and re-parsing the knowledge graph file
+        if kg_filename not in self._answers:
+            self._answers[kg_filename] = self._expand_identifier(identifier, query_factory, kg_filename)
+        return list(self._answers[kg_filename])
+
+    def _expand_identifier(self, identifier, query_factory, kg_filename):
 
         answer_kgs = []
 
@@ -142,23 +210,20 @@ class ConceptExpander:
         else:
             query = query_factory.get_query(identifier)
             logger.debug(query)
-            response = requests.post(
-                url=self.url,
-                headers=self.tranql_headers,
-                data=query).json()
+            response = self.post_query(query).json()
 
             # Case: Skip if empty KG
             try:
                 if not len(response["message"]["knowledge_graph"]["nodes"]):
                     logger.debug(f"Did not find a knowledge graph for {query}")
-                    logger.debug(f"{self.url} returned response: {response}")
+                    logger.debug("%s returned response: %s", self.url, response)
                     return []
             except KeyError as e:
                 logger.error(f"Could not find key: {e} in response: {response}")
 
-            # Dump out to file if there's a knowledge graph
+            # Dump out to file if there's a knowledge graph (encoded up front so it's one write)
             with open(kg_filename, 'w') as stream:
-                json.dump(response, stream, indent=2)
+                stream.write(json.dumps(response, indent=2))
 
         # Get nodes in knowledge graph hashed by ids for easy lookup
         noMessage = (len(response.get("message",{})) == 0)
@@ -172,7 +237,7 @@ class ConceptExpander:
         for answer in kg.answers:
             # Filter out answers that don't meet some criteria
             # Right now just don't filter anything
-            logger.debug(f"Answer: {answer}")
+            logger.debug("Answer: %s", answer)
             if not self.is_acceptable_answer(answer):
                 logger.warning("Skipping answer as it failed one or more acceptance criteria. See log for details.")
                 continue
@@ -299,14 +364,34 @@ class Annotator(ApiClient[str, List[Identifier]]):
 
 
 class Normalizer(ApiClient[Identifier, Identifier]):
-    def __init__(self, url):
+    def __init__(self, url, batch_size=50):
         self.url = url
+        self.batch_size = batch_size
+        # Normalization responses keyed on curie; the same curies turn up across many
+        # elements of a crawl, so each one is only sent to the service once
+        self._normalized = {}
 
     def normalize(self, identifier: Identifier, http_session: Session):
         # Use RENCI's normalization API service to get the preferred version of an identifier
         logger.debug(f"Normalizing: {identifier.id}")
         return self(identifier, http_session)
 
+    def normalize_batch(self, identifiers: List[Identifier], http_session: Session) -> List[Identifier]:
+        # The normalization service accepts repeated curie params, so look up up to batch_size
+        # unique curies per request instead of making one round-trip per identifier
+        curies = [curie for curie in dict.fromkeys(identifier.id for identifier in identifiers)
+                  if curie not in self._normalized]
+        logger.debug("Normalizing: %s", curies)
+
+        for i in range(0, len(curies), self.batch_size):
+            batch = curies[i:i + self.batch_size]
+            url = f"{self.url}{'&curie='.join(urllib.parse.quote(curie) for curie in batch)}"
+            normalized = http_session.get(url).json()
+            for curie in batch:
+                self._normalized[curie] = normalized.get(curie, {})
+
+        return [self.handle_response(identifier, self._normalized) for identifier in identifiers]
+
     def make_request(self, value: Identifier, http_session: Session) -> dict:
         curie = value.id
         url = f"{self.url}{urllib.parse.quote(curie)}"
@@ -330,7 +415,7 @@ class Normalizer(ApiClient[Identifier, Identifier]):
             logger.debug(f"ERROR: normalize({curie})=>({preferred_id}). No identifier?")
             return None
 
-        logger.debug(f"Preferred id: {preferred_id}")
+        logger.debug("Preferred id: %s", preferred_id)
         identifier.id = preferred_id.get('identifier', '')
         identifier.label = preferred_id.get('label', '')
         identifier.equivalent_identifiers = [v['identifier'] for v in equivalent_identifiers]
@@ -1,12 +1,18 @@
 import json
 import logging
 import os
-import traceback
+from concurrent.futures import ThreadPoolExecutor
 
 from dug.core.parsers import Parser, DugElement, DugConcept
 
 logger = logging.getLogger('dug')
 
+# Write buffer size (bytes) for the concept/element files dumped into the crawlspace
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+
+# Maximum number of TranQL queries in flight while expanding a concept
+MAX_TRANQL_WORKERS = 8
+
 
 class Crawler:
     def __init__(self, crawl_file: str, parser: Parser, annotator,
@@ -33,8 +39,7 @@ class Crawler:
             try:
                 os.makedirs(self.crawlspace)
             except Exception as e:
-                print(f"-----------> {e}")
-                traceback.print_exc()
+                logger.exception(f"Unable to create crawlspace {self.crawlspace}: {e}")
 
     def crawl(self):
 
@@ -53,34 +58,34 @@ class Crawler:
         self.annotate_elements()
 
         # Expand concepts
-        concept_file = open(f"{self.crawlspace}/concept_file.json", "w")
-        for concept_id, concept in self.concepts.items():
-            # Use TranQL queries to fetch knowledge graphs containing related but not synonymous biological terms
-            self.expand_concept(concept)
+        # Crawl output files get a large write buffer so the per-concept/per-element
+        # writes are coalesced into a handful of syscalls
+        with open(f"{self.crawlspace}/concept_file.json", "w", buffering=OUTPUT_BUFFER_SIZE) as concept_file, \
+                ThreadPoolExecutor(max_workers=MAX_TRANQL_WORKERS) as tranql_executor:
+            for concept_id, concept in self.concepts.items():
+                # Use TranQL queries to fetch knowledge graphs containing related but not synonymous biological terms
+                # (one worker pool is shared by every concept in the crawl)
+                self.expand_concept(concept, tranql_executor)
 
-            # Traverse identifiers to create single list of of search targets/synonyms for concept
-            concept.set_search_terms()
+                # Traverse identifiers to create single list of of search targets/synonyms for concept
+                concept.set_search_terms()
 
-            # Traverse kg answers to create list of optional search targets containing related concepts
-            concept.set_optional_terms()
+                # Traverse kg answers to create list of optional search targets containing related concepts
+                concept.set_optional_terms()
 
-            # Remove duplicate search terms and optional search terms
-            concept.clean()
+                # Remove duplicate search terms and optional search terms
+                concept.clean()
 
-            # Write concept out to a file
-            concept_file.write(f"{json.dumps(concept.get_searchable_dict(), indent=2)}")
+                # Write concept out to a file
+                concept_file.write(f"{json.dumps(concept.get_searchable_dict(), indent=2)}")
 
         # Set element optional terms now that concepts have been expanded
         # Open variable file for writing
-        variable_file = open(f"{self.crawlspace}/element_file.json", "w")
-        for element in self.elements:
-            if isinstance(element, DugElement):
-                element.set_optional_terms()
-                variable_file.write(f"{element.get_searchable_dict()}\n")
-
-        # Close concept, element files
-        concept_file.close()
-        variable_file.close()
+        with open(f"{self.crawlspace}/element_file.json", "w", buffering=OUTPUT_BUFFER_SIZE) as variable_file:
+            for element in self.elements:
+                if isinstance(element, DugElement):
+                    element.set_optional_terms()
+                    variable_file.write(f"{element.get_searchable_dict()}\n")
 
     def annotate_elements(self):
 
@@ -144,7 +149,16 @@ class Crawler:
             elif isinstance(element, DugConcept):
                 element.add_identifier(identifier)
 
-    def expand_concept(self, concept):
+    def expand_concept(self, concept, executor=None):
+
+        # Each TranQL query is an independent request, so issue all of this concept's
+        # (identifier, query) pairs concurrently and collect the answers in order
+        if executor is None:
+            # Called on its own rather than from crawl(); expand just this concept with its own pool
+            with ThreadPoolExecutor(max_workers=MAX_TRANQL_WORKERS) as executor:
+                return self.expand_concept(concept, executor)
+
+        expansions = []
 
         # Get knowledge graphs of terms related to each identifier
         for ident_id, identifier in concept.identifiers.items():
@@ -163,8 +177,10 @@ class Crawler:
 
                 # Fetch kg and answer
                 kg_outfile = f"{self.crawlspace}/{ident_id}_{query_name}.json"
-                answers = self.tranqlizer.expand_identifier(ident_id, query_factory, kg_outfile)
+                future = executor.submit(self.tranqlizer.expand_identifier, ident_id, query_factory, kg_outfile)
+                expansions.append((query_name, future))
 
-                # Add any answer knowledge graphs to
-                for answer in answers:
-                    concept.add_kg_answer(answer, query_name=query_name)
+        for query_name, future in expansions:
+            # Add any answer knowledge graphs to
+            for answer in future.result():
+                concept.add_kg_answer(answer, query_name=query_name)
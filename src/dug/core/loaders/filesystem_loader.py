@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 from typing import Iterator
 
@@ -14,4 +15,9 @@ def load_from_filesystem(filepath: InputFile) -> Iterator[Path]:
     if filepath.is_file():
         yield filepath
     else:
-        yield from filepath.glob("**/*")
+        # os.walk is backed by os.scandir, so file types come from the directory read
+        # itself instead of a stat per entry. Only files are yielded; subdirectories
+        # aren't crawlable targets.
+        for root, _dirs, files in os.walk(filepath):
+            for filename in files:
+                yield Path(root) / filename
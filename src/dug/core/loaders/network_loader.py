@@ -1,32 +1,70 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 from typing import Iterator
 from urllib.parse import urlparse
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from ._base import InputFile
 
 logger = logging.getLogger('dug')
 
+# Maximum number of downloads kept in flight at once
+MAX_CONCURRENT_FETCHES = 8
 
-def load_from_network(data_storage_dir: InputFile, urls: str) -> Iterator[Path]:
-    data_storage_dir = Path(data_storage_dir).resolve()
-    url_list = urls.split(",")
-    for url in url_list:
-        logger.info(f"Fetching {url}")
+# (connect, read) timeout in seconds for each download
+FETCH_TIMEOUT = (5, 60)
 
-        parse_result = urlparse(url)
-        response = requests.get(url)
+# Size (bytes) of the chunks downloads are streamed to disk in
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def build_session() -> requests.Session:
+    # Share one pool of keep-alive connections across all downloads and
+    # transparently retry transient server errors with backoff
+    retries = Retry(total=3, backoff_factor=1.0, status_forcelist=[429, 500, 502, 503, 504],
+                    raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=MAX_CONCURRENT_FETCHES,
+                          pool_maxsize=MAX_CONCURRENT_FETCHES,
+                          max_retries=retries)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def fetch_url(session: requests.Session, data_storage_dir: Path, url: str) -> Path:
+    logger.info(f"Fetching {url}")
+    with session.get(url, timeout=FETCH_TIMEOUT, stream=True) as response:
 
         if not response.ok:
             raise ValueError(f"Could not fetch {url}: {response.status_code}, {response.text}")
 
+        parse_result = urlparse(url)
         nonroot_path = parse_result.path.lstrip('/')
 
         output_location = data_storage_dir / parse_result.netloc / nonroot_path
         output_location.parent.mkdir(parents=True, exist_ok=True)
 
-        output_location.write_text(response.text)
+        # Stream the body straight to disk rather than holding the whole payload in memory
+        with output_location.open("wb") as output_file:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                output_file.write(chunk)
+
+    return output_location
+
+
+def load_from_network(data_storage_dir: InputFile, urls: str) -> Iterator[Path]:
+    data_storage_dir = Path(data_storage_dir).resolve()
+    # The same URL may be listed more than once; only download (and crawl) it once
+    url_list = list(dict.fromkeys(urls.split(",")))
 
-        yield output_location
\ No newline at end of file
+    # Downloads are I/O bound and independent of each other, so issue them concurrently
+    # and yield each one (in the order given) as soon as it's on disk
+    with build_session() as session, \
+            ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_FETCHES, len(url_list))) as executor:
+        yield from executor.map(partial(fetch_url, session, data_storage_dir), url_list)
@@ -106,15 +106,15 @@ class DugConcept:
         # Traverse set of identifiers to determine set of search terms
         search_terms = self.search_terms
         for ident_id, ident in self.identifiers.items():
-            search_terms.extend(ident.search_text + ident.synonyms)
+            search_terms.extend(ident.search_text)
+            search_terms.extend(ident.synonyms)
         self.search_terms = list(set(search_terms))
 
     def set_optional_terms(self):
         # Traverse set of knowledge graph answers to determine set of optional search terms
         optional_terms = self.optional_terms
         for kg_id, kg_answer in self.kg_answers.items():
-            optional_terms += kg_answer.get_node_names()
-            optional_terms += kg_answer.get_node_synonyms()
+            optional_terms.extend(kg_answer.get_node_terms())
         self.optional_terms = list(set(optional_terms))
 
     def get_searchable_dict(self):
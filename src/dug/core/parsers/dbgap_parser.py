@@ -9,6 +9,12 @@ from ._base import DugElement, FileParser, Indexable, InputFile
 
 logger = logging.getLogger('dug')
 
+# Pattern used to parse the study name out of a dbGaP data dictionary filename
+DBGAP_FILE_PATTERN = re.compile(r'.*/*phs[0-9]+\.v[0-9]\.pht[0-9]+\.v[0-9]\.(.+)\.data_dict.*')
+
+# Filename suffixes stripped from NIDA data dictionaries to get the study name
+NIDA_SUFFIXES = ("-Dictionary", "_DD")
+
 
 class DbGaPParser(FileParser):
     # Class for parsers DBGaP Data dictionary into a set of Dug Elements
@@ -18,23 +24,18 @@ class DbGaPParser(FileParser):
         stemname = os.path.splitext( os.path.basename(filename) )[0]
         if stemname.startswith("NIDA-"):
             sn = stemname
-            for s in ["-Dictionary", "_DD"]:
-                sn = sn.removesuffix(s) if sn.endswith(s) else sn
+            for s in NIDA_SUFFIXES:
+                sn = sn.removesuffix(s)
             return sn
 
         # Parse the study name from the xml filename if it exists. Return None if filename isn't right format to get id from
-        dbgap_file_pattern = re.compile(r'.*/*phs[0-9]+\.v[0-9]\.pht[0-9]+\.v[0-9]\.(.+)\.data_dict.*')
-        match = re.match(dbgap_file_pattern, filename)
+        match = DBGAP_FILE_PATTERN.match(filename)
         if match is not None:
             return match.group(1)
         return None
 
     def __call__(self, input_file: InputFile) -> List[Indexable]:
         logger.debug(input_file)
-        tree = ET.parse(input_file)
-        root = tree.getroot()
-        study_id = root.attrib['study_id']
-        participant_set = root.get('participant_set','0')
 
         # Parse study name from file handle
         study_name = self.parse_study_name_from_filename(str(input_file))
@@ -44,11 +45,22 @@ class DbGaPParser(FileParser):
             logger.error(err_msg)
             raise IOError(err_msg)
 
+        # Stream the document so only the variable currently being parsed is held in memory
+        events = ET.iterparse(input_file, events=('start', 'end'))
+        _, root = next(events)
+        study_id = root.attrib['study_id']
+        participant_set = root.get('participant_set','0')
+
         elements = []
-        for variable in root.iter('variable'):
+        for event, variable in events:
+            if event != 'end' or variable.tag != 'variable':
+                continue
+
+            # Index the variable's child fields in one pass rather than a find() per field
+            fields = {child.tag: child.text for child in variable}
             elem = DugElement(elem_id=f"{variable.attrib['id']}.p{participant_set}",
-                              name=variable.find('name').text,
-                              desc=variable.find('description').text.lower(),
+                              name=fields['name'],
+                              desc=fields['description'].lower(),
                               elem_type="DbGaP",
                               collection_id=f"{study_id}.p{participant_set}",
                               collection_name=study_name)
@@ -64,5 +76,8 @@ class DbGaPParser(FileParser):
             logger.debug(elem)
             elements.append(elem)
 
+            # Drop the parsed variables from the tree now that they've been converted
+            root.clear()
+
         # You don't actually create any concepts
         return elements
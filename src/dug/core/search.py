@@ -1,13 +1,55 @@
-import json
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
 import requests
-from elasticsearch import Elasticsearch
+from requests.adapters import HTTPAdapter
+from elasticsearch import Elasticsearch, helpers
 
 from dug.config import Config
 
 logger = logging.getLogger('dug')
 
+# Upper bound (bytes) on the size of a single bulk request
+BULK_MAX_CHUNK_BYTES = 10 * 1024 * 1024
+
+# Appends any of params.new_ids missing from an element's identifiers
+ELEMENT_IDENTIFIERS_SCRIPT = (
+    "for (id in params.new_ids) { "
+    "if (!ctx._source.identifiers.contains(id)) { ctx._source.identifiers.add(id); } "
+    "}"
+)
+
+# Times Elasticsearch retries an element update that hits a version conflict
+ELEMENT_UPDATE_RETRIES = 3
+
+# Maximum number of terms each fuzzy query term may expand to
+FUZZY_MAX_EXPANSIONS = 20
+
+# Parts of a search response returned to callers
+SEARCH_FILTER_PATH = ['hits.total', 'hits.hits._id', 'hits.hits._source']
+
+# Maximum number of agg_data_type/search_kg responses kept in the query cache
+QUERY_CACHE_SIZE = 1024
+
+# Elasticsearch client connection pool size (per node) and default request timeout in seconds
+ES_CONNECTION_POOL_SIZE = 25
+ES_TIMEOUT = 30
+
+# Timeout in seconds for the segment merge after a bulk load
+FORCEMERGE_TIMEOUT = 60 * 60
+
+# Timeout in seconds for interactive searches, so a pathological query fails fast instead of
+# tying up an API worker for the client's full default timeout. The client doesn't retry timed
+# out requests, so this bounds the whole call.
+SEARCH_TIMEOUT = 10
+
+# nboost connection pool size and (connect, read) timeout in seconds
+NBOOST_CONNECTION_POOL_SIZE = 25
+NBOOST_TIMEOUT = (2, SEARCH_TIMEOUT)
+
 
 class Search:
     """ Search -
@@ -29,18 +71,35 @@ class Search:
         logger.debug(f"Connecting to elasticsearch host: {self._cfg.elastic_host} at port: {self._cfg.elastic_port}")
 
         self.indices = indices
+        self.bulk_thread_count = int(self._cfg.bulk_thread_count)
+        self.bulk_chunk_size = int(self._cfg.bulk_chunk_size)
+        # Pending bulk actions queued by index_concept/index_element/index_kg_answer
+        self._index_buffer = []
+        # Recent agg_data_type/search_kg responses, keyed on their arguments
+        self.query_cache_ttl = int(self._cfg.query_cache_ttl)
+        self._query_cache = {}
+        self._query_cache_lock = threading.Lock()
         self.hosts = [{'host': self._cfg.elastic_host, 'port': self._cfg.elastic_port}]
 
         logger.debug(f"Authenticating as user {self._cfg.elastic_username} to host:{self.hosts}")
 
+        # Keep a pool of persistent connections per node. The transport still retries a dropped or
+        # idle socket (a connection error), but not a request that timed out: that request may
+        # still be running on the cluster, and resending searches, bulk chunks or a force merge
+        # would only multiply the wait and the load.
         self.es = Elasticsearch(hosts=self.hosts,
-                                http_auth=(self._cfg.elastic_username, self._cfg.elastic_password))
+                                http_auth=(self._cfg.elastic_username, self._cfg.elastic_password),
+                                maxsize=ES_CONNECTION_POOL_SIZE,
+                                timeout=ES_TIMEOUT)
+
+        # Reuse keep-alive connections to nboost across boosted searches
+        self._nboost_session = requests.Session()
+        self._nboost_session.mount("http://", HTTPAdapter(pool_maxsize=NBOOST_CONNECTION_POOL_SIZE))
 
         if self.es.ping():
             logger.info('connected to elasticsearch')
             self.init_indices()
         else:
-            print(f"Unable to connect to elasticsearch at {self._cfg.elastic_host}:{self._cfg.elastic_port}")
             logger.error(f"Unable to connect to elasticsearch at {self._cfg.elastic_host}:{self._cfg.elastic_port}")
             raise SearchException(
                 message='failed to connect to elasticsearch',
@@ -49,7 +108,7 @@ class Search:
     def init_indices(self):
         # The concepts and variable indices include an analyzer that utilizes the english
         # stopword facility from elastic search.  We also instruct each of the text mappings
-        # to use this analyzer. Note that we have not upgraded the kg index, because the fields
+        # to use this analyzer. Apart from search_targets, we have not upgraded the kg index, because the fields
         # in that index are primarily dynamic. We could eventually either add mappings so that
         # the fields are no longer dynamic or we could use the dynamic template capabilities 
         # described in 
@@ -58,7 +117,15 @@ class Search:
         kg_index = {
             "settings": {
                 "number_of_shards": 1,
-                "number_of_replicas": 0
+                "number_of_replicas": 0,
+                "analysis": {
+                    "analyzer": {
+                        "search_targets_analyzer": {
+                            "tokenizer": "standard",
+                            "filter": ["lowercase", "asciifolding"]
+                        }
+                    }
+                }
             },
             "mappings": {
                 "properties": {
@@ -67,6 +134,11 @@ class Search:
                     },
                     "type": {
                         "type": "text"
+                    },
+                    # search_kg's match query is analyzed with this same analyzer
+                    "search_targets": {
+                        "type": "text",
+                        "analyzer": "search_targets_analyzer"
                     }
                 }
             }
@@ -149,33 +221,183 @@ class Search:
 
         logger.info(f"creating indices")
         logger.debug(self.indices)
-        for index in self.indices:
+
+        def create_index(index):
+            # create() with ignore=400 is already idempotent, so there's no need to check
+            # whether the index exists first; an existing index just comes back as an error
+            result = self.es.indices.create(
+                index=index,
+                body=settings[index],
+                ignore=400)
+            if result.get('error', {}).get('type') == 'resource_already_exists_exception':
+                logger.info(f"Ignoring index {index} which already exists.")
+            else:
+                logger.info(f"result created index {index}: {result}")
+
+        # Index creation is independent per index, so don't wait on each one in turn
+        with ThreadPoolExecutor(max_workers=len(self.indices)) as executor:
             try:
-                if self.es.indices.exists(index=index):
-                    logger.info(f"Ignoring index {index} which already exists.")
-                else:
-                    result = self.es.indices.create(
-                        index=index,
-                        body=settings[index],
-                        ignore=400)
-                    logger.info(f"result created index {index}: {result}")
+                list(executor.map(create_index, self.indices))
             except Exception as e:
                 logger.error(f"exception: {e}")
                 raise e
 
     def index_doc(self, index, doc, doc_id):
+        self._clear_query_cache()
         self.es.index(
             index=index,
             id=doc_id,
             body=doc)
 
     def update_doc(self, index, doc, doc_id):
+        self._clear_query_cache()
         self.es.update(
             index=index,
             id=doc_id,
             body=doc
         )
 
+    def index_docs(self, index, docs):
+        """ Index an iterable of (doc_id, doc) pairs using the bulk API. """
+        actions = (
+            {'_op_type': 'index', '_index': index, '_id': doc_id, '_source': doc}
+            for doc_id, doc in docs
+        )
+        return self._bulk(actions)
+
+    def update_docs(self, index, docs):
+        """ Apply an iterable of (doc_id, update body) pairs using the bulk API. """
+        actions = (
+            {'_op_type': 'update', '_index': index, '_id': doc_id, **doc}
+            for doc_id, doc in docs
+        )
+        return self._bulk(actions)
+
+    def _bulk(self, actions):
+        # Send actions in chunks, several requests at a time, rather than one request per
+        # document. Each worker thread holds its own chunk, so memory grows with the thread
+        # count. Failed actions are logged and returned instead of aborting the rest of the batch.
+        self._clear_query_cache()
+        success_count, errors = 0, []
+        for ok, info in helpers.parallel_bulk(
+                self.es,
+                actions,
+                thread_count=self.bulk_thread_count,
+                chunk_size=self.bulk_chunk_size,
+                max_chunk_bytes=BULK_MAX_CHUNK_BYTES,
+                queue_size=self.bulk_thread_count,
+                raise_on_error=False,
+                request_timeout=60):
+            if ok:
+                success_count += 1
+            elif info.get('create', {}).get('status') == 409:
+                # Document already exists; creates are only used when that's fine
+                continue
+            else:
+                logger.error(f"Bulk indexing error: {info}")
+                errors.append(info)
+        return success_count, errors
+
+    def _buffer_action(self, action):
+        self._index_buffer.append(action)
+        # Hold enough actions to keep every bulk worker busy before sending
+        if len(self._index_buffer) >= self.bulk_chunk_size * self.bulk_thread_count:
+            self.flush_index_buffer()
+
+    def flush_index_buffer(self):
+        """ Send any actions queued by the index_* methods to Elasticsearch in bulk. """
+        if not self._index_buffer:
+            return 0, []
+        actions, self._index_buffer = self._index_buffer, []
+        return self._bulk(actions)
+
+    def _clear_query_cache(self):
+        # Cached responses may no longer reflect what's indexed
+        with self._query_cache_lock:
+            self._query_cache.clear()
+
+    def _cached_query(self, key, run_query):
+        """ Return the cached result for key if it hasn't expired, otherwise run the query and cache it. """
+        now = time.monotonic()
+        with self._query_cache_lock:
+            cached = self._query_cache.get(key)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        result = run_query()
+        with self._query_cache_lock:
+            if key not in self._query_cache and len(self._query_cache) >= QUERY_CACHE_SIZE:
+                # Evict the oldest entry
+                del self._query_cache[next(iter(self._query_cache))]
+            self._query_cache[key] = (now + self.query_cache_ttl, result)
+        return result
+
+    @contextmanager
+    def bulk_load_mode(self, indices, force_merge=False):
+        """
+        Disable refreshes and replicas on the given indices while they are bulk loaded,
+        then restore them and refresh so the new documents are searchable. Set force_merge
+        to also merge the resulting segments; only do so when no other writer is active.
+        """
+        index = ','.join(indices)
+        current = self.es.indices.get_settings(index=index, flat_settings=True)
+        original = {
+            name: self._settings_to_restore(index_settings['settings'])
+            for name, index_settings in current.items()
+        }
+        self.es.indices.put_settings(index=index, body={
+            'index.refresh_interval': '-1',
+            'index.number_of_replicas': 0
+        })
+        try:
+            yield
+        except BaseException:
+            # Put the settings back, but don't let a failure doing so hide the original error
+            try:
+                self._restore_settings(original)
+                self.es.indices.refresh(index=index)
+            except Exception:
+                logger.exception(f"Unable to restore settings on {index} after a failed bulk load")
+            raise
+        self._restore_settings(original)
+        self.es.indices.refresh(index=index)
+        if force_merge:
+            try:
+                # Merging a large index can take far longer than a normal request
+                self.es.indices.forcemerge(index=index, max_num_segments=5, request_timeout=FORCEMERGE_TIMEOUT)
+            except Exception:
+                # The data is already indexed; an unmerged index is only slower to search
+                logger.exception(f"Unable to force merge {index} after bulk load")
+
+    @staticmethod
+    def _settings_to_restore(settings):
+        # Settings left at their defaults aren't returned; restoring them as None resets the default.
+        # Disabled refreshes mean another bulk load is running (or one died part way), so they are
+        # never restored as is. Likewise zero replicas are never restored, as then there's nothing
+        # to put back and doing so could undo a restore by a load that overlapped this one.
+        refresh_interval = settings.get('index.refresh_interval')
+        restore = {'index.refresh_interval': None if refresh_interval == '-1' else refresh_interval}
+        if settings.get('index.number_of_replicas') not in ('0', 0):
+            restore['index.number_of_replicas'] = settings.get('index.number_of_replicas')
+        return restore
+
+    def _restore_settings(self, original):
+        for name, settings in original.items():
+            self.es.indices.put_settings(index=name, body=settings)
+
+    @staticmethod
+    def _pop_total_hits(search_results):
+        """
+        Remove the hit count returned alongside a track_total_hits search and return it.
+        The rest of the response is left in the shape filter_path gives without a count,
+        i.e. no 'hits' key at all when nothing matched.
+        """
+        hits = search_results.get('hits', {})
+        total_hits = hits.pop('total', {}).get('value', 0)
+        if not hits:
+            search_results.pop('hits', None)
+        return total_hits
+
     def search_concepts(self, index, query, offset=0, size=None, fuzziness=1, prefix_length=3):
         """
         Changed to a long boolean match query to optimize search results
@@ -272,16 +494,17 @@ class Search:
                 ]
             }
         }
-        body = json.dumps({'query': query})
-        total_items = self.es.count(body=body, index=index)
+        body = {'query': query}
         search_results = self.es.search(
             index=index,
             body=body,
-            filter_path=['hits.hits._id', 'hits.hits._type', 'hits.hits._source'],
+            filter_path=SEARCH_FILTER_PATH,
             from_=offset,
-            size=size
+            size=size,
+            track_total_hits=True,
+            request_timeout=SEARCH_TIMEOUT
         )
-        search_results.update({'total_items': total_items['count']})
+        search_results.update({'total_items': self._pop_total_hits(search_results)})
         return search_results
 
     def search_variables(self, index, concept="", query="", size=None, data_type=None, offset=0, fuzziness=1,
@@ -412,31 +635,43 @@ class Search:
                 }
             }
         
-        body = json.dumps({'query': query})
-        total_items = self.es.count(body=body, index=index)
+        body = {'query': query}
         search_results = self.es.search(
             index=index,
             body=body,
-            filter_path=['hits.hits._id', 'hits.hits._type', 'hits.hits._source'],
+            filter_path=SEARCH_FILTER_PATH,
             from_=offset,
-            size=size
+            size=size,
+            track_total_hits=True,
+            request_timeout=SEARCH_TIMEOUT
         )
+        total_items = self._pop_total_hits(search_results)
 
         # Reformat Results
         new_results = {}
         if not search_results:
            # we don't want to error on a search not found
-           new_results.update({'total_items': total_items['count']})
+           new_results.update({'total_items': total_items})
            return new_results
 
+        seen = set()
         for elem in search_results['hits']['hits']:
             elem_s = elem['_source']
             elem_type = elem_s['data_type']
-            if elem_type not in new_results:
-                new_results[elem_type] = {}
+
+            # Only the requested data type is returned, so don't build buckets for the others
+            if data_type and elem_type != data_type:
+                continue
 
             elem_id = elem_s['element_id']
             coll_id = elem_s['collection_id']
+
+            # Skip elements that have already been added to this collection
+            if (elem_type, coll_id, elem_id) in seen:
+                continue
+            seen.add((elem_type, coll_id, elem_id))
+
+            type_results = new_results.setdefault(elem_type, {})
             elem_info = {
                 "description": elem_s['element_desc'],
                 "e_link": elem_s['element_action'],
@@ -445,7 +680,7 @@ class Search:
             }
 
             # Case: collection not in dictionary for given data_type
-            if coll_id not in new_results[elem_type]:
+            if coll_id not in type_results:
                 # initialize document
                 doc = {}
 
@@ -456,29 +691,29 @@ class Search:
                 doc['elements'] = [elem_info]
 
                 # save document
-                new_results[elem_type][coll_id] = doc
+                type_results[coll_id] = doc
 
-            # Case: collection already in dictionary for given element_type; append elem_info.  Assumes no duplicate elements
+            # Case: collection already in dictionary for given element_type; append elem_info
             else:
-                new_results[elem_type][coll_id]['elements'].append(elem_info)
+                type_results[coll_id]['elements'].append(elem_info)
+
+        # Return results
+        if bool(data_type):
+            return list(new_results[data_type].values()) if data_type in new_results else {}
 
         # Flatten dicts to list
         for i in new_results:
             new_results[i] = list(new_results[i].values())
-
-        # Return results
-        if bool(data_type):
-            if data_type in new_results:
-                new_results = new_results[data_type]
-            else:
-                new_results = {}
         return new_results
 
     def agg_data_type(self, index, size=0):
         """
-        In variable seach, the concept MUST match one of the indentifiers in the list
-        The query can match search_terms (hence, "should") for ranking.
+        Return the list of data types present in the index.
+        size is accepted for backwards compatibility; no hits are ever returned.
         """
+        return list(self._cached_query(('agg_data_type', index), lambda: self._agg_data_type(index)))
+
+    def _agg_data_type(self, index):
         aggs = {
             "data_type": {
                 "terms": {
@@ -487,116 +722,170 @@ class Search:
                 }
             }
         }
-        body = json.dumps({'aggs': aggs})
+        # Only the buckets are needed, and the shard request cache only caches size=0 requests
+        body = {'size': 0, 'aggs': aggs}
 
         search_results = self.es.search(
             index=index,
             body=body,
-            size=size
+            filter_path=['aggregations.data_type.buckets.key'],
+            request_cache=True,
+            request_timeout=SEARCH_TIMEOUT
         )
-        data_type_list = [data_type['key'] for data_type in search_results['aggregations']['data_type']['buckets']]
-        search_results.update({'data type list': data_type_list})
-        return data_type_list
+        # filter_path drops the aggregation entirely when there are no buckets
+        buckets = search_results.get('aggregations', {}).get('data_type', {}).get('buckets', [])
+        return [data_type['key'] for data_type in buckets]
 
-    def search_kg(self, index, unique_id, query, offset=0, size=None, fuzziness=1, prefix_length=3):
+    def search_kg(self, index, unique_id, query, offset=0, size=None, fuzziness=1, prefix_length=3, fields=None):
         """
         In knowledge graph search seach, the concept MUST match the unique ID
         The query MUST match search_targets.  The updated query allows for
         fuzzy matching and for the default OR behavior for the query.
+        If fields is given, only those _source fields are returned (e.g. leaving
+        out the often large knowledge_graph).
         """
-        query = {
+        fields = tuple(fields) if fields else None
+        key = ('search_kg', index, unique_id, query, offset, size, fuzziness, prefix_length, fields)
+        return self._cached_query(
+            key, lambda: self._search_kg(index, unique_id, query, offset, size, fuzziness, prefix_length, fields))
+
+    def _search_kg(self, index, unique_id, query, offset, size, fuzziness, prefix_length, fields):
+        body = {'query': self._kg_query(unique_id, query, fuzziness, prefix_length)}
+        search_results = self.es.search(
+            index=index,
+            body=body,
+            filter_path=SEARCH_FILTER_PATH,
+            _source_includes=list(fields) if fields else None,
+            from_=offset,
+            size=size,
+            track_total_hits=True,
+            request_timeout=SEARCH_TIMEOUT
+        )
+        search_results.update({'total_items': self._pop_total_hits(search_results)})
+        return search_results
+
+    @staticmethod
+    def _kg_query(unique_id, query, fuzziness, prefix_length):
+        return {
             "bool": {
                 "must": [
                     {"term": {
                         "concept_id.keyword": unique_id
                     }
                     },
-                    {'query_string': {
-                        "query": query,
-                        "fuzziness": fuzziness,
-                        "fuzzy_prefix_length": prefix_length,
-                        "default_field": "search_targets"
+                    {"match": {
+                        "search_targets": {
+                            "query": query,
+                            "fuzziness": fuzziness,
+                            "prefix_length": prefix_length,
+                            "max_expansions": FUZZY_MAX_EXPANSIONS,
+                            "operator": "or"
+                        }
                     }
                     }
                 ]
             }
         }
-        body = json.dumps({'query': query})
-        total_items = self.es.count(body=body, index=index)
-        search_results = self.es.search(
+
+    def scan_kg(self, index, unique_id, query, page_size=1000, fuzziness=1, prefix_length=3):
+        """
+        Yield every knowledge graph hit for the unique ID and query.
+        Uses a scroll rather than from/size paging, so walking deep into the results
+        doesn't make Elasticsearch re-collect every earlier hit for each page.
+        """
+        yield from helpers.scan(
+            self.es,
             index=index,
-            body=body,
-            filter_path=['hits.hits._id', 'hits.hits._type', 'hits.hits._source'],
-            from_=offset,
-            size=size
+            query={'query': self._kg_query(unique_id, query, fuzziness, prefix_length)},
+            size=page_size,
+            preserve_order=False
         )
-        search_results.update({'total_items': total_items['count']})
-        return search_results
 
-    def search_nboost(self, index, query, offset=0, size=10, fuzziness=1):
+    def search_nboost(self, index, query, offset=0, size=10, fuzziness=1, fields=None):
         """
-        Query type is now 'query_string'.
-        query searches multiple fields
-        if search terms are surrounded in quotes, looks for exact matches in any of the fields
-        AND/OR operators are natively supported by elasticesarch queries
+        Query type is now 'multi_match'.
+        query searches multiple fields, fuzzily matching the analyzed query terms
+        rather than expanding every term of a query_string against the whole index
+        If fields is given, only those _source fields are returned.
         """
         nboost_query = {
             'nboost': {
                 'uhost': f"{self._cfg.elastic_username}:{self._cfg.elastic_password}@{self._cfg.elastic_host}",
                 'uport': self._cfg.elastic_port,
                 'cvalues_path': '_source.description',
-                'query_path': 'body.query.query_string.query',
+                'query_path': 'body.query.multi_match.query',
                 'size': size,
                 'from': offset,
                 'default_topk': size
             },
             'query': {
-                'query_string': {
+                'multi_match': {
                     'query': query,
                     'fuzziness': fuzziness,
+                    'max_expansions': FUZZY_MAX_EXPANSIONS,
                     'fields': ['name', 'description', 'instructions', 'search_targets', 'optional_targets'],
-                    'quote_field_suffix': ".exact"
+                    'type': "best_fields"
                 }
             }
         }
+        if fields:
+            nboost_query['_source'] = list(fields)
 
-        return requests.post(url=f"http://{self._cfg.nboost_host}:{self._cfg.nboost_port}/{index}/_search", json=nboost_query).json()
+        return self._nboost_session.post(url=f"http://{self._cfg.nboost_host}:{self._cfg.nboost_port}/{index}/_search",
+                                         json=nboost_query, timeout=NBOOST_TIMEOUT).json()
 
     def index_concept(self, concept, index):
-        # Don't re-index if already in index
-        if self.es.exists(index, concept.id):
-            return
-        """ Index the document. """
-        self.index_doc(
-            index=index,
-            doc=concept.get_searchable_dict(),
-            doc_id=concept.id)
+        """ Queue the document for indexing. Call flush_index_buffer() once the batch is complete. """
+        # Don't re-index if already in index; a create is rejected (and ignored) if the concept exists
+        self._buffer_action({
+            '_op_type': 'create',
+            '_index': index,
+            '_id': concept.id,
+            '_source': concept.get_searchable_dict()
+        })
 
     def index_element(self, elem, index):
-        if not self.es.exists(index, elem.id):
-            # If the element doesn't exist, add it directly
-            self.index_doc(
-                index=index,
-                doc=elem.get_searchable_dict(),
-                doc_id=elem.id)
-        else:
-            # Otherwise update to add any new identifiers that weren't there last time around
-            results = self.es.get(index, elem.id)
-            identifiers = results['_source']['identifiers'] + list(elem.concepts.keys())
-            doc = {"doc": {}}
-            doc['doc']['identifiers'] = list(set(identifiers))
-            self.update_doc(index=index, doc=doc, doc_id=elem.id)
+        self.index_elements([elem], index)
+
+    def index_elements(self, elems, index):
+        """ Queue a batch of elements for indexing, merging identifiers into any already indexed. """
+        # The same element can appear more than once in a crawl (e.g. once per tag). Bulk chunks are
+        # sent concurrently, so merge duplicates here rather than racing updates to the same document.
+        merged = {}
+        for elem in elems:
+            if elem.id in merged:
+                merged[elem.id][1].update(elem.concepts.keys())
+            else:
+                merged[elem.id] = (elem, set(elem.concepts.keys()))
+
+        for elem, concept_ids in merged.values():
+            doc = elem.get_searchable_dict()
+            doc['identifiers'] = sorted(concept_ids)
+            # New elements are added as-is via the upsert. Existing ones only get any new identifiers
+            # appended server-side, so neither a lookup nor the full identifier list is sent.
+            self._buffer_action({
+                '_op_type': 'update',
+                '_index': index,
+                '_id': elem.id,
+                # Another writer (e.g. a concurrent crawl) may update the same element
+                'retry_on_conflict': ELEMENT_UPDATE_RETRIES,
+                'script': {
+                    'source': ELEMENT_IDENTIFIERS_SCRIPT,
+                    'lang': 'painless',
+                    'params': {'new_ids': doc['identifiers']}
+                },
+                'upsert': doc
+            })
 
     def index_kg_answer(self, concept_id, kg_answer, index, id_suffix=None):
 
         # Get search targets by extracting names/synonyms from non-curie nodes in answer knoweldge graph
-        search_targets = kg_answer.get_node_names(include_curie=False)
-        search_targets += kg_answer.get_node_synonyms(include_curie=False)
+        search_targets = kg_answer.get_node_terms(include_curie=False)
 
-        # Create the Doc
+        # Create the Doc. Targets are lowercased (as the analyzer would) so case variants are only stored once
         doc = {
             'concept_id': concept_id,
-            'search_targets': list(set(search_targets)),
+            'search_targets': sorted({target.lower() for target in search_targets if target}),
             'knowledge_graph': kg_answer.get_kg()
         }
 
@@ -605,11 +894,13 @@ class Search:
         id_suffix = list(kg_answer.nodes.keys()) if id_suffix is None else id_suffix
         unique_doc_id = f"{concept_id}_{id_suffix}"
 
-        """ Index the document. """
-        self.index_doc(
-            index=index,
-            doc=doc,
-            doc_id=unique_doc_id)
+        """ Queue the document for indexing. """
+        self._buffer_action({
+            '_op_type': 'index',
+            '_index': index,
+            '_id': unique_doc_id,
+            '_source': doc
+        })
 
 
 class SearchException(Exception):
@@ -1,5 +1,10 @@
 import json, re
 
+# Patterns used by QueryKG._snake_case, compiled once rather than on every call
+NON_ALPHANUMERIC_PATTERN = re.compile(r'\W')
+CAMEL_CASE_PATTERN = re.compile(r'(?<=[a-z])[A-Z](?=[a-z])')
+LEADING_CAPITAL_PATTERN = re.compile(r'^[A-Z](?=[a-z])')
+
 
 class MissingNodeReferenceError(BaseException):
     pass
@@ -103,22 +108,30 @@ class QueryKG:
         edges_dict = self.kg.get("knowledge_graph", {}).get("edges", {})
         return [self.get_edge(kg_id) for kg_id in edges_dict]
 
+    def _get_answer_nodes(self, include_curie=True):
+        # Knowledge graph nodes, optionally leaving out the ones bound in the question
+        if include_curie:
+            return self.get_nodes()
+        curie_ids = set(self.get_curie_ids())
+        return [node for node in self.get_nodes() if node['id'] not in curie_ids]
+
     def get_node_names(self, include_curie=True):
-        node_names = []
-        curie_ids = self.get_curie_ids()
-        for node in self.get_nodes():
-            if include_curie or node['id'] not in curie_ids:
-                node_names.append(node['name'])
-        return node_names
+        return [node['name'] for node in self._get_answer_nodes(include_curie)]
 
     def get_node_synonyms(self, include_curie=True):
         node_synonyms = []
-        curie_ids = self.get_curie_ids()
-        for node in self.get_nodes():
-            if include_curie or node['id'] not in curie_ids:
-                node_synonyms += node.get('synonyms') or []
+        for node in self._get_answer_nodes(include_curie):
+            node_synonyms.extend(node.get('synonyms') or [])
         return node_synonyms
 
+    def get_node_terms(self, include_curie=True):
+        # Names and synonyms together, in one pass over the nodes
+        node_terms = []
+        for node in self._get_answer_nodes(include_curie):
+            node_terms.append(node['name'])
+            node_terms.extend(node.get('synonyms') or [])
+        return node_terms
+
     def get_curie_ids(self):
         question_nodes_dict = self.question.get('nodes', {})
         return [question_nodes_dict[node]['id'] for node in question_nodes_dict if 'id' in question_nodes_dict[node]]
@@ -161,9 +174,7 @@ class QueryKG:
             for binding_type in bindings:
                 for q_id in bindings[binding_type]:
                     kg_ids = [x["id"] for x in bindings[binding_type][q_id]]
-                    old_binding[binding_type] = old_binding.get(binding_type, {})
-                    old_binding[binding_type][q_id] = old_binding[binding_type].get(q_id,[])
-                    old_binding[binding_type][q_id] = kg_ids
+                    old_binding.setdefault(binding_type, {})[q_id] = kg_ids
             old_kg_model["knowledge_map"].append(old_binding)
         old_kg_model["knowledge_graph"]["nodes"] = self.get_nodes()
         for node in old_kg_model["knowledge_graph"]["nodes"]:
@@ -184,16 +195,14 @@ class QueryKG:
         CamelCase is replaced with snake_case.
         """
         # replace non-alphanumeric characters with _
-        tmp = re.sub(r'\W', '_', arg)
+        tmp = NON_ALPHANUMERIC_PATTERN.sub('_', arg)
         # replace X with _x
-        tmp = re.sub(
-            r'(?<=[a-z])[A-Z](?=[a-z])',
+        tmp = CAMEL_CASE_PATTERN.sub(
             lambda c: '_' + c.group(0).lower(),
             tmp
         )
         # lower-case first character
-        tmp = re.sub(
-            r'^[A-Z](?=[a-z])',
+        tmp = LEADING_CAPITAL_PATTERN.sub(
             lambda c: c.group(0).lower(),
             tmp
         )
@@ -239,6 +248,9 @@ class QueryFactory:
         # Validate that all entries in question graph are actually valid types
         self.validate_factory()
 
+        # The query only varies by curie, so build everything up to the curie once
+        self.query_prefix = self.build_query_prefix()
+
     def validate_factory(self):
         # Check to make sure all the question types are valid
         for question in self.question_graph:
@@ -260,12 +272,7 @@ class QueryFactory:
         # Curie doesn't start with an acceptable prefix
         return False
 
-    def get_query(self, curie):
-
-        # Return nothing if not valid curie
-        if not self.is_valid_curie(curie):
-            return None
-
+    def build_query_prefix(self):
         question = []
         seen = []
         curie_id = ""
@@ -288,5 +295,13 @@ class QueryFactory:
             # Append to list of actual terms that will appear in query
             question.append(query)
 
+        return f"select {'->'.join(question)} from '{self.source}' where {curie_id}="
+
+    def get_query(self, curie):
+
+        # Return nothing if not valid curie
+        if not self.is_valid_curie(curie):
+            return None
+
         # Build and return query
-        return f"select {'->'.join(question)} from '{self.source}' where {curie_id}='{curie}'"
+        return f"{self.query_prefix}'{curie}'"
@@ -2,7 +2,9 @@ import tempfile
 from pathlib import Path
 from unittest.mock import MagicMock
 
+from dug.core.annotate import Identifier
 from dug.core.crawler import Crawler
+from dug.core.parsers import DugConcept
 from tests.integration.conftest import TEST_DATA_DIR
 
 
@@ -71,3 +73,31 @@ def test_crawl():
     with tempfile.TemporaryDirectory() as temp_dir:
         crawler.crawlspace = str(Path(temp_dir) / 'crawl')
         crawler.crawl()
+
+
+def test_expand_concept():
+    tranqlizer = MagicMock()
+    tranqlizer.expand_identifier.side_effect = \
+        lambda ident_id, query_factory, kg_outfile: [MagicMock(nodes={ident_id: {}, kg_outfile: {}})]
+    query_factory = MagicMock()
+    query_factory.is_valid_curie.return_value = True
+
+    crawler = Crawler(
+        crawl_file=TEST_DATA_DIR / "crawler_sample_file.csv",
+        parser=MagicMock(),
+        annotator=MagicMock(),
+        tranqlizer=tranqlizer,
+        tranql_queries={"disease": query_factory, "pheno": query_factory},
+        http_session=MagicMock(),
+        exclude_identifiers=["CHEBI:17336"],
+    )
+
+    concept = DugConcept("MONDO:0005068", "myocardial infarction", "", "disease")
+    for ident_id in ["MONDO:0005068", "HP:0001658", "CHEBI:17336"]:
+        concept.add_identifier(Identifier(ident_id, ident_id))
+
+    crawler.expand_concept(concept)
+
+    assert tranqlizer.expand_identifier.call_count == 4
+    assert len(concept.kg_answers) == 4
+    assert all(answer_id.endswith(("_disease", "_pheno")) for answer_id in concept.kg_answers)
@@ -3,6 +3,7 @@ import os
 import pytest
 from elasticsearch import Elasticsearch
 
+from dug.core.parsers import DugConcept, DugElement
 from dug.core.search import Search
 from dug.config import Config
 
@@ -34,3 +35,28 @@ def test_search_init():
     Tests if we can create a Search instance without it blowing up :D
     """
     Search(cfg=Config.from_env())
+
+
+@pytest.mark.skipif(not is_elastic_up(), reason="ElasticSearch is down")
+def test_index_elements_merges_identifiers():
+    """
+    Runs the element identifier upsert script against a real Elasticsearch
+    """
+    search = Search(cfg=Config.from_env())
+    element_id = "test_index_elements_merges_identifiers"
+    search.es.delete(index='variables_index', id=element_id, ignore=404)
+
+    element = DugElement(element_id, "diabetes status", "", "dbGaP")
+    element.add_concept(DugConcept("MONDO:0005148", "type 2 diabetes", "", "disease"))
+    search.index_elements([element], index='variables_index')
+    search.flush_index_buffer()
+
+    element.add_concept(DugConcept("HP:0001513", "obesity", "", "phenotypic_feature"))
+    search.index_elements([element], index='variables_index')
+    search.flush_index_buffer()
+
+    try:
+        doc = search.es.get(index='variables_index', id=element_id)
+        assert sorted(doc['_source']['identifiers']) == ["HP:0001513", "MONDO:0005148"]
+    finally:
+        search.es.delete(index='variables_index', id=element_id, ignore=404)
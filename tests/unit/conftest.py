@@ -17,14 +17,19 @@ class MockResponse:
 
 class MockApiService:
     def __init__(self, urls: Dict[str, list]):
-        self.urls = urls
+        # Key responses on the parsed URL so lookups don't depend on query parameter order
+        self.urls = {self._key(url): response for url, response in urls.items()}
 
-    def get(self, url, params: dict = None):
+    @staticmethod
+    def _key(url, params: dict = None):
+        split = urllib.parse.urlsplit(url)
+        query = urllib.parse.parse_qsl(split.query, keep_blank_values=True)
         if params:
-            qstr = urllib.parse.urlencode(params, quote_via=urllib.parse.quote)
-            url = f"{url}?{qstr}"
+            query.extend((key, str(value)) for key, value in params.items())
+        return split.scheme, split.netloc, split.path, frozenset(query)
 
-        text, status_code = self.urls.get(url)
+    def get(self, url, params: dict = None):
+        text, status_code = self.urls.get(self._key(url, params), (None, 404))
 
         if text is None:
             return MockResponse(text="{}", status_code=404)
@@ -1,10 +1,14 @@
 from copy import copy
 from typing import List
+from unittest.mock import patch, MagicMock
 
 import pytest
+import requests
 
 from dug.config import Config
-from dug.core.annotate import Identifier, Preprocessor, Annotator, Normalizer, SynonymFinder, OntologyHelper
+from dug.core.annotate import Identifier, Preprocessor, Annotator, Normalizer, SynonymFinder, OntologyHelper, \
+    ConceptExpander, DugAnnotator
+from tests.unit.conftest import MockResponse
 
 
 def test_identifier():
@@ -201,6 +205,31 @@ def test_normalizer(normalizer_api):
     ]
 
 
+def test_normalizer_batch(normalizer_api):
+    url = "http://normalizer.api/?curie="
+
+    identifiers = [
+        Identifier("UBERON:0007100", label='primary circulatory organ', search_text=['heart']),
+        Identifier("UBERON:0007100", label='primary circulatory organ', search_text=['heart']),
+    ]
+
+    normalizer = Normalizer(url)
+    outputs = normalizer.normalize_batch(identifiers, normalizer_api)
+    assert len(outputs) == 2
+    for output in outputs:
+        assert isinstance(output, Identifier)
+        assert output.id == 'UBERON:0007100'
+        assert output.equivalent_identifiers == ['UBERON:0007100']
+
+    assert normalizer.normalize_batch([], normalizer_api) == []
+
+    # Curies that have already been normalized aren't sent to the service again
+    http_session = MagicMock()
+    output, = normalizer.normalize_batch([Identifier("UBERON:0007100", label='heart')], http_session)
+    assert output.id == 'UBERON:0007100'
+    http_session.get.assert_not_called()
+
+
 def test_synonym_finder(synonym_api):
     curie = "UBERON:0007100"
     url = f"http://synonyms.api/?curie="
@@ -234,3 +263,96 @@ def test_ontology_helper(ontology_api):
     assert name == 'primary circulatory organ'
     assert description == 'A hollow, muscular organ, which, by contracting rhythmically, keeps up the circulation of the blood or analogs[GO,modified].'
     assert ontology_type == 'anatomical entity'
+
+
+@patch('dug.core.annotate.time.sleep')
+@patch('dug.core.annotate.requests.Session.post')
+def test_concept_expander_retries_transient_errors(mock_post, mock_sleep):
+    mock_post.side_effect = [
+        requests.exceptions.ConnectionError("connection reset"),
+        MockResponse(text="{}", status_code=503),
+        MockResponse(text='{"message": {}}', status_code=200),
+    ]
+
+    expander = ConceptExpander("http://tranql.api/", max_retries=3)
+    response = expander.post_query("select disease->phenotypic_feature from 'redis:test'")
+
+    assert response.json() == {"message": {}}
+    assert mock_post.call_count == 3
+    assert mock_sleep.call_count == 2
+
+
+@patch('dug.core.annotate.time.sleep')
+@patch('dug.core.annotate.requests.Session.post')
+def test_concept_expander_gives_up_after_max_retries(mock_post, mock_sleep):
+    mock_post.return_value = MockResponse(text="{}", status_code=500)
+
+    expander = ConceptExpander("http://tranql.api/", max_retries=2)
+    response = expander.post_query("select disease->phenotypic_feature from 'redis:test'")
+
+    assert response.status_code == 500
+    assert mock_post.call_count == 3
+    assert mock_sleep.call_count == 2
+
+
+def test_dug_annotator_memoizes_curie_lookups(tmp_path):
+    annotator = MagicMock()
+    annotator.annotate.side_effect = lambda text, http_session: [Identifier("UBERON:0007100", "heart")]
+    normalizer = MagicMock()
+    normalizer.normalize_batch.side_effect = lambda identifiers, http_session: identifiers
+    synonym_finder = MagicMock()
+    synonym_finder.get_synonyms.return_value = ["adult heart"]
+    ontology_helper = MagicMock()
+    ontology_helper.get_ontology_info.return_value = ("primary circulatory organ", "", "anatomical entity")
+
+    dug_annotator = DugAnnotator(
+        preprocessor=Preprocessor(),
+        annotator=annotator,
+        normalizer=normalizer,
+        synonym_finder=synonym_finder,
+        ontology_helper=ontology_helper,
+    )
+    dug_annotator.anno_fails_file = str(tmp_path / "anno_fails.txt")
+
+    for text in ["heart", "heart attack", "heart rate"]:
+        identifiers = dug_annotator.annotate(text, http_session=None)
+        assert identifiers[0].synonyms == ["adult heart"]
+        assert identifiers[0].label == "primary circulatory organ"
+
+    assert synonym_finder.get_synonyms.call_count == 1
+    assert ontology_helper.get_ontology_info.call_count == 1
+
+
+def test_dug_annotator_skips_unannotatable_text(tmp_path):
+    annotator = MagicMock()
+    annotator.annotate.return_value = []
+    normalizer = MagicMock()
+
+    dug_annotator = DugAnnotator(
+        preprocessor=Preprocessor(),
+        annotator=annotator,
+        normalizer=normalizer,
+        synonym_finder=MagicMock(),
+        ontology_helper=MagicMock(),
+    )
+    dug_annotator.anno_fails_file = str(tmp_path / "anno_fails.txt")
+
+    assert dug_annotator.annotate("", http_session=None) == []
+    assert dug_annotator.annotate("gibberish", http_session=None) == []
+    assert dug_annotator.annotate("gibberish", http_session=None) == []
+
+    assert annotator.annotate.call_count == 1
+    assert normalizer.normalize_batch.call_count == 0
+
+
+@patch('dug.core.annotate.requests.Session.post')
+def test_concept_expander_reuses_answers(mock_post, tmp_path):
+    mock_post.return_value = MockResponse(text='{"message": {"knowledge_graph": {"nodes": {}}}}')
+    query_factory = MagicMock()
+    query_factory.get_query.return_value = "select disease->phenotypic_feature from 'redis:test'"
+    kg_filename = str(tmp_path / "MONDO:0005068_disease.json")
+
+    expander = ConceptExpander("http://tranql.api/")
+    assert expander.expand_identifier("MONDO:0005068", query_factory, kg_filename) == []
+    assert expander.expand_identifier("MONDO:0005068", query_factory, kg_filename) == []
+    assert mock_post.call_count == 1
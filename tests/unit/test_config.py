@@ -1,3 +1,4 @@
+import dataclasses
 import os
 from unittest import mock
 
@@ -15,3 +16,13 @@ def test_config_created_from_env_vars():
     assert cfg.elastic_password == "ohwhoa"
     assert cfg.redis_password == "thatsprettyneat"
     assert cfg.nboost_host == "gettinboosted!"
+
+
+def test_config_defaults_are_independent_copies():
+    cfg = Config()
+    cfg.preprocessor["debreviator"]["HR"] = "heart rate"
+    cfg.tranql_queries["disease"].append("gene")
+
+    assert Config().preprocessor["debreviator"] == {"BMI": "body mass index"}
+    assert Config().tranql_queries["disease"] == ["disease", "phenotypic_feature"]
+    assert dataclasses.asdict(Config())["preprocessor"]["stopwords"] == ["the"]
@@ -1,9 +1,14 @@
+import json
 import os
 from dataclasses import dataclass, field
+from types import SimpleNamespace
 from unittest.mock import patch
 
 import pytest
+from elasticsearch import Connection, ConnectionTimeout, Elasticsearch
+from elasticsearch.serializer import JSONSerializer
 
+from dug.core.parsers import DugConcept, DugElement
 from dug.core.search import Search, SearchException
 from dug.config import Config
 
@@ -32,9 +37,6 @@ class MockIndex:
     def get(self, id):
         return self.values.get(id)
 
-    def count(self, body):
-        return len(self.values)
-
 
 class MockIndices:
 
@@ -42,17 +44,34 @@ class MockIndices:
         self._indices = {}
         self.call_count = 0
 
-    def exists(self, index):
-        return index in self._indices
-
     def create(
             self,
             index,
             body,
             **_kwargs
     ):
+        if index in self._indices:
+            return {'error': {'type': 'resource_already_exists_exception'}, 'status': 400}
         self.call_count += 1
         self._indices[index] = MockIndex(**body)
+        return {'acknowledged': True, 'index': index}
+
+    def get_settings(self, index, **_kwargs):
+        return {name: {'settings': dict(self._indices[name].settings)} for name in index.split(',')}
+
+    def put_settings(self, index, body, **_kwargs):
+        for name in index.split(','):
+            settings = self._indices[name].settings
+            settings.update(body)
+            for key, value in body.items():
+                if value is None:
+                    del settings[key]
+
+    def refresh(self, index, **_kwargs):
+        pass
+
+    def forcemerge(self, index, **_kwargs):
+        pass
 
     def get_index(self, index) -> MockIndex:
         return self._indices.get(index)
@@ -63,6 +82,8 @@ class MockElastic:
     def __init__(self, indices: MockIndices):
         self.indices = indices
         self._up = True
+        self.transport = SimpleNamespace(serializer=JSONSerializer())
+        self.bulk_call_count = 0
 
     def index(self, index, id=None, body=None):
         self.indices.get_index(index).index(id, body)
@@ -70,6 +91,32 @@ class MockElastic:
     def update(self, index, id=None, body=None):
         self.indices.get_index(index).update(id, body)
 
+    def bulk(self, body, **_kwargs):
+        self.bulk_call_count += 1
+        lines = [json.loads(line) for line in body.splitlines() if line]
+        items = []
+        for action_line, source in zip(lines[::2], lines[1::2]):
+            (op_type, meta), = action_line.items()
+            index = self.indices.get_index(meta['_index'])
+            if op_type == 'create' and index.get(meta['_id']) is not None:
+                items.append({op_type: {'_id': meta['_id'], 'status': 409}})
+                continue
+            if op_type == 'update' and 'script' in source:
+                # Stand-in for ELEMENT_IDENTIFIERS_SCRIPT; the painless itself is only exercised
+                # against a real Elasticsearch in tests/integration/test_search.py
+                existing = index.get(meta['_id'])
+                if existing is None:
+                    index.index(meta['_id'], source['upsert'])
+                else:
+                    new_ids = source['script']['params']['new_ids']
+                    existing['identifiers'].extend(i for i in new_ids if i not in existing['identifiers'])
+            elif op_type == 'update':
+                index.update(meta['_id'], source['doc'])
+            else:
+                index.index(meta['_id'], source)
+            items.append({op_type: {'_id': meta['_id'], 'status': 200}})
+        return {'errors': any(item[op]['status'] >= 300 for item in items for op in item), 'items': items}
+
     def ping(self):
         return self._up
 
@@ -79,20 +126,26 @@ class MockElastic:
     def disconnect(self):
         self._up = False
 
-    def count(self, body, index):
-        return {
-            'count': self.indices.get_index(index).count(body)
-        }
-
-    def search(self, index, body, **kwargs):
+    def search(self, index, body=None, **kwargs):
+        # Every document in the index is treated as a hit
         values = self.indices.get_index(index).values
-        return {
-            'results': {
-                k: v
-                for k, v in values.items()
-                if body in v
-            }
-        }
+        if kwargs.get('_source_includes'):
+            values = {k: {f: v[f] for f in kwargs['_source_includes'] if f in v} for k, v in values.items()}
+        hits = {}
+        if values:
+            hits['hits'] = [{'_id': k, '_source': v} for k, v in values.items()]
+        if kwargs.get('track_total_hits'):
+            hits['total'] = {'value': len(values), 'relation': 'eq'}
+        if kwargs.get('scroll'):
+            # Everything comes back in the first page of a scroll
+            return {'_scroll_id': 'scroll', '_shards': {'total': 1, 'successful': 1}, 'hits': {'hits': [], **hits}}
+        return {'hits': hits} if hits else {}
+
+    def scroll(self, **_kwargs):
+        return {'_scroll_id': 'scroll', '_shards': {'total': 1, 'successful': 1}, 'hits': {'hits': []}}
+
+    def clear_scroll(self, **_kwargs):
+        pass
 
 
 @pytest.fixture
@@ -147,3 +200,272 @@ def test_update_doc(elastic: MockElastic):
     search.update_doc('concepts_index', {'name': 'new value!'}, "ID:1")
     assert elastic.indices.get_index('concepts_index').get("ID:1") == {'name': 'new value!'}
 
+
+def test_index_docs(elastic: MockElastic):
+    search = Search(Config.from_env())
+
+    docs = [(f"ID:{i}", {'name': f'sample {i}'}) for i in range(3)]
+    success_count, errors = search.index_docs('concepts_index', docs)
+    assert success_count == 3
+    assert errors == []
+    assert elastic.bulk_call_count == 1
+    assert elastic.indices.get_index('concepts_index').get("ID:2") == {'name': 'sample 2'}
+
+
+def test_update_docs(elastic: MockElastic):
+    search = Search(Config.from_env())
+
+    search.index_docs('concepts_index', [("ID:1", {'name': 'sample'})])
+    search.update_docs('concepts_index', [("ID:1", {'doc': {'name': 'new value!'}})])
+    assert elastic.indices.get_index('concepts_index').get("ID:1") == {'name': 'new value!'}
+
+
+def test_search_concepts(elastic: MockElastic):
+    search = Search(Config.from_env())
+
+    assert search.search_concepts('concepts_index', 'heart attack') == {'total_items': 0}
+
+    search.index_doc('concepts_index', {'name': 'heart attack'}, "ID:1")
+    search.index_doc('concepts_index', {'name': 'heart'}, "ID:2")
+    results = search.search_concepts('concepts_index', 'heart attack')
+    assert results['total_items'] == 2
+    assert results['hits'] == {'hits': [
+        {'_id': "ID:1", '_source': {'name': 'heart attack'}},
+        {'_id': "ID:2", '_source': {'name': 'heart'}},
+    ]}
+
+
+def test_search_kg(elastic: MockElastic):
+    search = Search(Config.from_env())
+
+    assert search.search_kg('kg_index', "MONDO:0005148", 'diabetes') == {'total_items': 0}
+
+    search.index_doc('kg_index', {'concept_id': "MONDO:0005148", 'search_targets': ['diabetes']}, "ID:1")
+    results = search.search_kg('kg_index', "MONDO:0005148", 'diabetes')
+    assert results['total_items'] == 1
+    assert results['hits']['hits'][0]['_id'] == "ID:1"
+
+
+def test_search_kg_fields(elastic: MockElastic):
+    search = Search(Config.from_env())
+
+    search.index_doc('kg_index', {
+        'concept_id': "MONDO:0005148",
+        'search_targets': ['diabetes'],
+        'knowledge_graph': {'nodes': [], 'edges': []}
+    }, "ID:1")
+    results = search.search_kg('kg_index', "MONDO:0005148", 'diabetes', fields=['concept_id', 'search_targets'])
+    assert results['hits']['hits'][0]['_source'] == {'concept_id': "MONDO:0005148", 'search_targets': ['diabetes']}
+
+    results = search.search_kg('kg_index', "MONDO:0005148", 'diabetes')
+    assert 'knowledge_graph' in results['hits']['hits'][0]['_source']
+
+
+def test_scan_kg(elastic: MockElastic):
+    search = Search(Config.from_env())
+
+    for i in range(3):
+        search.index_doc('kg_index', {'concept_id': "MONDO:0005148", 'search_targets': ['diabetes']}, f"ID:{i}")
+    hits = list(search.scan_kg('kg_index', "MONDO:0005148", 'diabetes'))
+    assert [hit['_id'] for hit in hits] == ["ID:0", "ID:1", "ID:2"]
+
+
+def test_search_kg_is_cached(elastic: MockElastic):
+    search = Search(Config.from_env())
+    search.index_doc('kg_index', {'concept_id': "MONDO:0005148", 'search_targets': ['diabetes']}, "ID:1")
+
+    with patch.object(elastic, 'search', wraps=elastic.search) as es_search:
+        first = search.search_kg('kg_index', "MONDO:0005148", 'diabetes')
+        assert search.search_kg('kg_index', "MONDO:0005148", 'diabetes') == first
+        assert es_search.call_count == 1
+
+        search.search_kg('kg_index', "MONDO:0005148", 'diabetes', offset=10)
+        assert es_search.call_count == 2
+
+        # Indexing invalidates cached responses
+        search.index_docs('kg_index', [("ID:2", {'concept_id': "MONDO:0005148", 'search_targets': ['t2d']})])
+        assert search.search_kg('kg_index', "MONDO:0005148", 'diabetes')['total_items'] == 2
+        assert es_search.call_count == 3
+
+
+class TimingOutConnection(Connection):
+    """ Answers the client's product check, then times out every other request """
+    attempts = 0
+
+    def perform_request(self, method, url, *args, **kwargs):
+        if url == '/':
+            info = {'version': {'number': '7.17.0', 'build_flavor': 'default'}, 'tagline': "You Know, for Search"}
+            return 200, {'X-Elastic-Product': 'Elasticsearch'}, json.dumps(info)
+        TimingOutConnection.attempts += 1
+        raise ConnectionTimeout("TIMEOUT", "timed out", None)
+
+
+def test_search_timeout_is_not_retried():
+    with patch('dug.core.search.Elasticsearch') as es_class:
+        es_class.return_value = MockElastic(indices=MockIndices())
+        search = Search(Config.from_env())
+    # A real client built the way Search builds it, over a connection where every request times out
+    search.es = Elasticsearch(**es_class.call_args.kwargs, connection_class=TimingOutConnection)
+    TimingOutConnection.attempts = 0
+
+    with pytest.raises(ConnectionTimeout):
+        search.search_concepts('concepts_index', "diabetes")
+    assert TimingOutConnection.attempts == 1
+
+
+def test_search_variables_no_results(elastic: MockElastic):
+    search = Search(Config.from_env())
+
+    assert search.search_variables('variables_index', query='heart attack') == {'total_items': 0}
+
+
+def test_search_variables_data_type(elastic: MockElastic):
+    search = Search(Config.from_env())
+
+    for elem_id, coll_id, data_type in [("phv1", "phs1", "dbGaP"), ("phv2", "phs1", "dbGaP"), ("nida1", "nida", "NIDA")]:
+        search.index_doc('variables_index', {
+            'element_id': elem_id,
+            'element_name': elem_id,
+            'element_desc': "",
+            'element_action': "",
+            'collection_id': coll_id,
+            'collection_name': coll_id,
+            'collection_action': "",
+            'data_type': data_type,
+        }, elem_id)
+
+    results = search.search_variables('variables_index', query='heart attack')
+    assert set(results) == {'dbGaP', 'NIDA'}
+    assert [elem['id'] for elem in results['dbGaP'][0]['elements']] == ["phv1", "phv2"]
+
+    results = search.search_variables('variables_index', query='heart attack', data_type='NIDA')
+    assert len(results) == 1
+    assert results[0]['c_id'] == "nida"
+    assert search.search_variables('variables_index', query='heart attack', data_type='TOPMed') == {}
+
+
+def test_index_concept_and_element_are_buffered(elastic: MockElastic):
+    search = Search(Config.from_env())
+
+    concept = DugConcept("MONDO:0005148", "type 2 diabetes", "", "disease")
+    element = DugElement("phv1", "diabetes status", "", "dbGaP")
+    element.add_concept(concept)
+    search.index_concept(concept, index='concepts_index')
+    search.index_element(element, index='variables_index')
+
+    assert elastic.bulk_call_count == 0
+    assert elastic.indices.get_index('concepts_index').get("MONDO:0005148") is None
+
+    search.flush_index_buffer()
+    assert elastic.bulk_call_count == 1
+    assert elastic.indices.get_index('concepts_index').get("MONDO:0005148")['name'] == "type 2 diabetes"
+    assert elastic.indices.get_index('variables_index').get("phv1")['identifiers'] == ["MONDO:0005148"]
+
+    # Nothing left to send
+    assert search.flush_index_buffer() == (0, [])
+    assert elastic.bulk_call_count == 1
+
+
+def test_index_concept_skips_existing(elastic: MockElastic):
+    search = Search(Config.from_env())
+
+    search.index_concept(DugConcept("MONDO:0005148", "type 2 diabetes", "", "disease"), index='concepts_index')
+    search.flush_index_buffer()
+
+    search.index_concept(DugConcept("MONDO:0005148", "diabetes mellitus type 2", "", "disease"), index='concepts_index')
+    assert search.flush_index_buffer() == (0, [])
+    assert elastic.indices.get_index('concepts_index').get("MONDO:0005148")['name'] == "type 2 diabetes"
+
+
+def test_index_elements(elastic: MockElastic):
+    search = Search(Config.from_env())
+
+    diabetes = DugConcept("MONDO:0005148", "type 2 diabetes", "", "disease")
+    obesity = DugConcept("MONDO:0011122", "obesity", "", "disease")
+    elements = [DugElement(f"phv{i}", "diabetes status", "", "dbGaP") for i in range(3)]
+    for element in elements:
+        element.add_concept(diabetes)
+    search.index_elements(elements, index='variables_index')
+    search.flush_index_buffer()
+    assert elastic.indices.get_index('variables_index').get("phv1")['identifiers'] == ["MONDO:0005148"]
+
+    # Existing elements only have their identifiers extended
+    elements[0].add_concept(obesity)
+    elements[0].add_concept(DugConcept("HP:0001513", "obesity", "", "phenotypic_feature"))
+    search.index_elements(elements[:1], index='variables_index')
+    search.flush_index_buffer()
+    assert sorted(elastic.indices.get_index('variables_index').get("phv0")['identifiers']) == [
+        "HP:0001513", "MONDO:0005148", "MONDO:0011122"
+    ]
+
+
+def test_index_elements_merges_duplicate_ids(elastic: MockElastic):
+    search = Search(Config.from_env())
+
+    # e.g. TOPMed tag rows: the same variable once per tag
+    first = DugElement("phv1", "diabetes status", "", "TOPMed")
+    first.add_concept(DugConcept("MONDO:0005148", "type 2 diabetes", "", "disease"))
+    second = DugElement("phv1", "diabetes status", "", "TOPMed")
+    second.add_concept(DugConcept("HP:0001513", "obesity", "", "phenotypic_feature"))
+
+    search.index_elements([first, second], index='variables_index')
+    assert len(search._index_buffer) == 1
+    action, = search._index_buffer
+    assert action['retry_on_conflict'] == 3
+    assert action['upsert']['identifiers'] == ["HP:0001513", "MONDO:0005148"]
+
+    search.flush_index_buffer()
+    assert elastic.indices.get_index('variables_index').get("phv1")['identifiers'] == [
+        "HP:0001513", "MONDO:0005148"
+    ]
+
+
+def test_bulk_load_mode(elastic: MockElastic):
+    search = Search(Config.from_env())
+    concepts_index = elastic.indices.get_index('concepts_index')
+    concepts_index.settings['index.refresh_interval'] = '30s'
+
+    with patch.object(elastic.indices, 'refresh') as refresh, \
+            patch.object(elastic.indices, 'forcemerge') as forcemerge:
+        with search.bulk_load_mode(['concepts_index', 'kg_index']):
+            assert concepts_index.settings['index.refresh_interval'] == '-1'
+            assert elastic.indices.get_index('kg_index').settings['index.refresh_interval'] == '-1'
+
+    assert concepts_index.settings['index.refresh_interval'] == '30s'
+    assert 'index.refresh_interval' not in elastic.indices.get_index('kg_index').settings
+    refresh.assert_called_once_with(index='concepts_index,kg_index')
+    forcemerge.assert_not_called()
+
+    with patch.object(elastic.indices, 'forcemerge') as forcemerge:
+        with search.bulk_load_mode(['concepts_index'], force_merge=True):
+            pass
+    forcemerge.assert_called_once()
+
+
+def test_bulk_load_mode_overlapping(elastic: MockElastic):
+    search = Search(Config.from_env())
+    kg_index = elastic.indices.get_index('kg_index')
+    kg_index.settings['index.number_of_replicas'] = '1'
+
+    first_load = search.bulk_load_mode(['kg_index'])
+    second_load = search.bulk_load_mode(['kg_index'])
+    first_load.__enter__()
+    second_load.__enter__()
+    first_load.__exit__(None, None, None)
+    second_load.__exit__(None, None, None)
+
+    # The second load saw the first one's settings, which must not outlive both loads
+    assert 'index.refresh_interval' not in kg_index.settings
+    assert kg_index.settings['index.number_of_replicas'] == '1'
+
+
+def test_bulk_load_mode_keeps_original_error(elastic: MockElastic):
+    search = Search(Config.from_env())
+
+    with patch.object(elastic.indices, 'forcemerge') as forcemerge, \
+            patch.object(elastic.indices, 'put_settings', wraps=elastic.indices.put_settings) as put_settings:
+        with pytest.raises(ValueError):
+            with search.bulk_load_mode(['concepts_index']):
+                put_settings.side_effect = SearchException(message="restore failed", details="")
+                raise ValueError("crawl failed")
+        forcemerge.assert_not_called()